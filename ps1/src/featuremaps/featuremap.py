@@ -1,12 +1,82 @@
+import collections
 import util
 import numpy as np
-import matplotlib.pyplot as plt
+from scipy import linalg
+from util import plt
 
 np.seterr(all='raise')
 
 
 factor = 2.0
 
+
+class FeatureMap(object):
+    """Chainable feature map on the x column (column 1) of the data.
+
+    Bases are concatenated in the order they are added. Results are cached
+    per (data identity, k), so repeated calls on the same array (train set,
+    plot grid) reuse the matrix. The returned arrays are read-only; arrays
+    must not be modified in place after being mapped.
+
+    Example usage:
+        > fmap = FeatureMap().poly().sin()
+        > fmap(k, X)  # same as LinearModel().create_sin(k, X)
+    """
+
+    def __init__(self, max_cache=32):
+        """
+        Args:
+            max_cache: Number of feature matrices to keep (least recently
+                used ones are dropped first).
+        """
+        self.bases = []
+        self.max_cache = max_cache
+        self.cache = collections.OrderedDict()
+
+    def poly(self):
+        """Add powers x^0, ..., x^k."""
+        return self.custom(lambda k, x: np.vander(x, k + 1, increasing=True))
+
+    def sin(self):
+        """Add sin(x)."""
+        return self.custom(lambda k, x: np.sin(x))
+
+    def custom(self, fn):
+        """Add the columns fn(k, x), where x has shape (n_examples,) and fn
+        returns an array of shape (n_examples,) or (n_examples, m)."""
+        self.bases.append(fn)
+        self.cache.clear()
+        return self
+
+    def __call__(self, k, X):
+        """Map X to features of degree k.
+
+        Args:
+            k: Degree passed to every basis.
+            X: Inputs of shape (n_examples, 2).
+
+        Returns:
+            Features of shape (n_examples, total basis columns).
+        """
+        key = (id(X), k)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key][1]
+        x = X[:, 1]
+        cols = [fn(k, x) for fn in self.bases]
+        features = np.column_stack([c.reshape(x.shape[0], -1) for c in cols])
+        features.setflags(write=False)
+        # Keep a reference to X so its id cannot be reused while cached
+        self.cache[key] = (X, features)
+        if len(self.cache) > self.max_cache:
+            self.cache.popitem(last=False)
+        return features
+
+
+poly_map = FeatureMap().poly()
+sin_map = FeatureMap().poly().sin()
+
+
 class LinearModel(object):
     """Base class for linear models."""
 
@@ -26,9 +96,29 @@ class LinearModel(object):
             y: Training example labels. Shape (n_examples,).
         """
         # *** START CODE HERE ***
-        self.theta = np.dot(np.linalg.inv(np.dot(X.transpose(), X)), np.dot(X.transpose(), y))
+        self.theta = self.fit_sweep(X, y, [X.shape[1]])[0].theta
         # *** END CODE HERE ***
 
+    def fit_sweep(self, X, y, sizes):
+        """Fit one model per leading column block X[:, :p], p in sizes.
+
+        A single QR factorization X = QR is shared by every fit: the least
+        squares solution on the first p columns is R[:p, :p]^-1 (Q^T y)[:p].
+        This also avoids the squared condition number of the normal equations.
+
+        Args:
+            X: Training example inputs. Shape (n_examples, dim).
+            y: Training example labels. Shape (n_examples,).
+            sizes: Numbers of leading columns to fit on, each at most dim.
+
+        Returns:
+            List of fitted LinearModel, one per entry of sizes.
+        """
+        Q, R = np.linalg.qr(X[:, :max(sizes)])
+        qty = np.dot(Q.transpose(), y)
+        return [LinearModel(linalg.solve_triangular(R[:p, :p], qty[:p]))
+                for p in sizes]
+
     def create_poly(self, k, X):
         """
         Generates a polynomial feature map using the data x.
@@ -39,13 +129,7 @@ class LinearModel(object):
             X: Training example inputs. Shape (n_examples, 2).
         """
         # *** START CODE HERE ***
-        n = X.shape[0]
-        x1 = X[:,1]
-        new_x = np.zeros([n,k+1])
-        if k == 1: new_x = X
-        for i in range(0,k+1):
-            new_x[:,i] = x1**i
-        return new_x
+        return poly_map(k, X)
         # *** END CODE HERE ***
 
     def create_sin(self, k, X):
@@ -57,12 +141,7 @@ class LinearModel(object):
             X: Training example inputs. Shape (n_examples, 2).
         """
         # *** START CODE HERE ***
-        n = X.shape[0]
-        x1 = X[:,1]
-        new_x = np.zeros((n,k+2))
-        new_x[:,0:k+1] = self.create_poly(k, X)
-        new_x[:,k+1] = np.sin(x1)
-        return new_x
+        return sin_map(k, X)
         # *** END CODE HERE ***
 
     def predict(self, X):
@@ -81,28 +160,54 @@ class LinearModel(object):
         # *** END CODE HERE ***
 
 
+def fit_degree_sweep(train_x, train_y, ks, sine=False):
+    """Fit a model for every degree in ks from one basis and one QR.
+
+    Args:
+        train_x: Training example inputs. Shape (n_examples, 2).
+        train_y: Training example labels. Shape (n_examples,).
+        ks: Polynomial degrees to fit.
+        sine: Add the sin(x) feature as in create_sin.
+
+    Returns:
+        Dict mapping each k to a LinearModel whose theta matches the column
+        order of create_poly(k, .) (or create_sin(k, .) if sine).
+    """
+    clf = LinearModel()
+    K = max(ks)
+    if sine:
+        # Move sin(x) first so every degree is a leading column block
+        X = np.roll(clf.create_sin(K, train_x), 1, axis=1)
+        models = clf.fit_sweep(X, train_y, [k + 2 for k in ks])
+        for model in models:
+            model.theta = np.roll(model.theta, -1)
+    else:
+        X = clf.create_poly(K, train_x)
+        models = clf.fit_sweep(X, train_y, [k + 1 for k in ks])
+    return dict(zip(ks, models))
+
+
 def run_exp(train_path, sine=False, ks=[1, 2, 3, 5, 10, 20], filename='plot.png'):
     train_x,train_y=util.load_dataset(train_path,add_intercept=True)
     plot_x = np.ones([1000, 2])
     plot_x[:, 1] = np.linspace(-factor*np.pi, factor*np.pi, 1000)
     plt.figure()
     plt.scatter(train_x[:, 1], train_y)
+    # *** START CODE HERE ***
+    models = fit_degree_sweep(train_x, train_y, ks, sine)
+    # *** END CODE HERE ***
 
     for k in ks:
         '''
         Our objective is to train models and perform predictions on plot_x data
         '''
         # *** START CODE HERE ***
-        # Define model
-        clf = LinearModel()
+        clf = models[k]
         # get features
         if sine:
-            train_poly_X = clf.create_sin(k, train_x)
             plot_poly_X = clf.create_sin(k, plot_x)
         else:
-            train_poly_X = clf.create_poly(k, train_x)
             plot_poly_X = clf.create_poly(k, plot_x)
-        clf.fit(train_poly_X, train_y)
         plot_y = clf.predict(plot_poly_X)
         # *** END CODE HERE ***
         '''
@@ -114,6 +219,7 @@ def run_exp(train_path, sine=False, ks=[1, 2, 3, 5, 10, 20], filename='plot.png'
     plt.legend()
     plt.savefig(filename)
     plt.clf()
+    return models
 
 
 def main(train_path, small_path, eval_path):
@@ -0,0 +1,104 @@
+import collections
+import numpy as np
+
+
+ThresholdSweep = collections.namedtuple('ThresholdSweep', [
+    'thresholds', 'tpr', 'fpr', 'precision', 'accuracy', 'balanced_accuracy'])
+
+
+def threshold_sweep(probs, y):
+    """Evaluate the rule "predict 1 if prob >= t" at every distinct threshold.
+
+    A single sort of the probabilities gives the true and false positive
+    counts at every threshold as cumulative sums, so the whole sweep costs
+    O(n log n) instead of one pass per threshold. Tied probabilities are
+    merged into one threshold.
+
+    Args:
+        probs: Predicted probabilities. Shape (n_examples,).
+        y: True labels in {0, 1}. Shape (n_examples,).
+
+    Returns:
+        ThresholdSweep of arrays of shape (n_thresholds + 1,), ordered by
+        decreasing threshold. The first entry is threshold inf (predict all
+        negative). Precision is defined as 1 when nothing is predicted
+        positive.
+    """
+    probs = np.asarray(probs, dtype=float).ravel()
+    y = np.asarray(y).ravel() == 1
+    order = np.argsort(-probs, kind='mergesort')
+    probs, y = probs[order], y[order]
+    # Index of the last example in each run of tied probabilities
+    last = np.append(np.nonzero(np.diff(probs))[0], probs.shape[0] - 1)
+    tp = np.append(0, np.cumsum(y)[last])
+    fp = np.append(0, last + 1) - tp
+    n_pos = tp[-1]
+    n_neg = fp[-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tpr = tp / float(n_pos)
+        fpr = fp / float(n_neg)
+        precision = np.where(tp + fp > 0, tp / (tp + fp).astype(float), 1.)
+    return ThresholdSweep(
+        thresholds=np.append(np.inf, probs[last]),
+        tpr=tpr,
+        fpr=fpr,
+        precision=precision,
+        accuracy=(tp + n_neg - fp) / float(probs.shape[0]),
+        balanced_accuracy=0.5 * (tpr + 1 - fpr))
+
+
+def roc_auc(probs, y, sweep=None):
+    """Area under the ROC curve by the trapezoidal rule.
+
+    Args:
+        probs: Predicted probabilities. Shape (n_examples,).
+        y: True labels in {0, 1}. Shape (n_examples,).
+        sweep: Optional ThresholdSweep of (probs, y), to avoid sorting again.
+    """
+    if sweep is None: sweep = threshold_sweep(probs, y)
+    return np.sum(np.diff(sweep.fpr) * (sweep.tpr[1:] + sweep.tpr[:-1]) / 2)
+
+
+def best_threshold(probs, y, metric='balanced_accuracy', sweep=None):
+    """Threshold maximizing a metric of the sweep.
+
+    Args:
+        probs: Predicted probabilities. Shape (n_examples,).
+        y: True labels in {0, 1}. Shape (n_examples,).
+        metric: Name of a ThresholdSweep field, e.g. 'accuracy'.
+        sweep: Optional ThresholdSweep of (probs, y), to avoid sorting again.
+
+    Returns:
+        threshold: Best threshold (predict 1 if prob >= threshold).
+        value: Metric value at that threshold.
+    """
+    # Validate metric argument
+    allowed_metrics = ThresholdSweep._fields[1:]
+    if metric not in allowed_metrics:
+        raise ValueError('Invalid metric: {} (expected {})'
+                         .format(metric, allowed_metrics))
+
+    if sweep is None: sweep = threshold_sweep(probs, y)
+    values = getattr(sweep, metric)
+    i = np.nanargmax(values)
+    return sweep.thresholds[i], values[i]
+
+
+def metrics_at(probs, y, threshold=0.5):
+    """Accuracy, positive/negative accuracy and balanced accuracy at a
+    threshold (predict 1 if prob >= threshold, as in threshold_sweep).
+
+    Args:
+        probs: Predicted probabilities. Shape (n_examples,).
+        y: True labels in {0, 1}. Shape (n_examples,).
+        threshold: Decision threshold.
+
+    Returns:
+        accuracy, pos_accuracy, neg_accuracy, balanced_accuracy
+    """
+    y = np.asarray(y).ravel() == 1
+    y_hat = np.asarray(probs).ravel() >= threshold
+    pos_accuracy = np.mean(y_hat[y])
+    neg_accuracy = np.mean(~y_hat[~y])
+    return (np.mean(y == y_hat), pos_accuracy, neg_accuracy,
+            0.5 * (pos_accuracy + neg_accuracy))
@@ -1,5 +1,6 @@
 import numpy as np
 import util
+import evaluation
 import sys
 from random import random
 
@@ -36,51 +37,33 @@ def main(train_path, validation_path, save_path):
     clf = LogisticRegression()
     clf.fit(x_train , y_train)
     probabilities = clf.predict(x_eval)
-    predictions = (probabilities>0.5).astype('int')
-
-    def classifierAccuracy(y_true, y_hat):
-        return np.mean(y_true==y_hat)
-
-    def posNegAccuracy(y_true, y_hat):
-        pos = y_true==1
-        posAcc = np.mean(y_true[pos]==y_hat[pos])
-        negAcc = np.mean(y_true[~pos]==y_hat[~pos])
-        return posAcc, negAcc
-
-    A = classifierAccuracy(y_eval, predictions)
-    posAcc, negAcc = posNegAccuracy(y_eval, predictions)
-    A_bar = 0.5 * (posAcc+negAcc)
+    A, posAcc, negAcc, A_bar = evaluation.metrics_at(probabilities, y_eval)
     print('Accuracy is: ', A)
     print('Positive Accuracy is: {}. Negative accuracy is {}.'.format(posAcc, negAcc))
     print('Balanced Accuracy is: ', A_bar)
+    # Moving the operating point needs no retraining: sweep every threshold
+    sweep = evaluation.threshold_sweep(probabilities, y_eval)
+    t, A_best = evaluation.best_threshold(probabilities, y_eval, sweep=sweep)
+    print('ROC-AUC is: ', evaluation.roc_auc(probabilities, y_eval, sweep=sweep))
+    print('Best balanced accuracy is {} at threshold {}.'.format(A_best, t))
     util.plot(x_eval, y_eval, clf.theta, output_path_naive.replace('txt', 'jpg'))
     # Make sure to save predicted probabilities to output_path_naive using np.savetxt()
     np.savetxt(output_path_naive, probabilities)
     # Part (d): Upsampling minority class
     # Make sure to save predicted probabilities to output_path_upsampling using np.savetxt()
-    # Repeat minority examples 1 / kappa times
-
-    def resample(x, y, kappa):
-        pos = (y==1)
-        x_resampled_pos = np.repeat(x[pos], 1/kappa, axis=0)
-        y_resampled_pos = np.repeat(y[pos], 1 / kappa, axis=0)
-        x_resampled = np.append(x_resampled_pos, x[~pos], axis=0)
-        y_resampled = np.append(y_resampled_pos, y[~pos], axis=0)
-        return x_resampled, y_resampled
-
-    x_resampled, y_resampled = resample(x_train, y_train, kappa)
+    # Weight minority examples by 1 / kappa, which is equivalent to repeating
+    # them 1 / kappa times without copying any rows
     clf2 = LogisticRegression()
-    clf2.fit(x_resampled, y_resampled)
+    clf2.fit(x_train, y_train, sample_weight=np.where(y_train == 1, 1 / kappa, 1.))
     probabilities2 = clf2.predict(x_eval)
-    predictions2 = (probabilities2>0.5).astype('int')
-    A2 = classifierAccuracy(y_eval, predictions2)
-    posAcc2, negAcc2 = posNegAccuracy(y_eval, predictions2)
-    A_bar2 = 0.5 * (posAcc2 + negAcc2)
+    A2, posAcc2, negAcc2, A_bar2 = evaluation.metrics_at(probabilities2, y_eval)
     print('Accuracy is: ', A2)
     print('Positive Accuracy is: {}. Negative accuracy is {}.'.format(posAcc2, negAcc2))
     print('Balanced Accuracy is: ', A_bar2)
     util.plot(x_eval, y_eval, clf2.theta, output_path_upsampling.replace('txt', 'jpg'))
     np.savetxt(output_path_upsampling, probabilities2)
+    # Wait for the background plots so rendering errors are raised here
+    util.plot_sink.flush()
     # *** END CODE HERE
 
 if __name__ == '__main__':
@@ -1,6 +1,99 @@
-import matplotlib.pyplot as plt
+import atexit
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+import pickle
+import sys
+import traceback
+
 import numpy as np
 
+
+class LazyPyplot(object):
+    """matplotlib.pyplot, imported on first use.
+
+    Training and prediction never pay for the import. The non-interactive Agg
+    backend is selected when no display is available, so headless runs never
+    load a GUI toolkit.
+    """
+    def __getattr__(self, name):
+        if 'matplotlib.pyplot' not in sys.modules:
+            import matplotlib
+            headless = not (os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+            if os.name == 'posix' and sys.platform != 'darwin' and headless:
+                matplotlib.use('Agg')
+        import matplotlib.pyplot
+        return getattr(matplotlib.pyplot, name)
+
+
+plt = LazyPyplot()
+
+class PlotSink(object):
+    """Renders figures in a background process, off the training critical path.
+
+    submit() snapshots a module-level render function and its array arguments
+    and returns immediately; a single worker process draws and saves the
+    figure with the Agg backend. flush() waits for everything queued so far
+    and re-raises rendering errors. Pending plots are flushed at exit, and a
+    failure there makes the process exit with status 1.
+    """
+    def __init__(self):
+        self.pool = None
+        self.pending = []
+
+    def submit(self, render_fn, *args):
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(1, initializer=init_plot_worker)
+            atexit.register(self.close_at_exit)
+        payload = pickle.dumps((render_fn, args), protocol=pickle.HIGHEST_PROTOCOL)
+        self.pending.append(self.pool.apply_async(run_render, (payload,)))
+
+    def flush(self):
+        pending, self.pending = self.pending, []
+        for result in pending:
+            result.get()
+
+    def close(self):
+        if self.pool is None:
+            return
+        try:
+            self.flush()
+        finally:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def close_at_exit(self):
+        """Flush pending plots at exit, exiting with status 1 if one failed.
+
+        An exception raised by an atexit handler only prints a traceback and
+        leaves the exit status at 0, so failures are reported here and the
+        process is ended explicitly.
+        """
+        try:
+            self.close()
+        except Exception:
+            traceback.print_exc()
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(1)
+
+
+def init_plot_worker():
+    """Use the non-interactive Agg backend in the plotting process."""
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def run_render(payload):
+    render_fn, args = pickle.loads(payload)
+    render_fn(*args)
+
+
+plot_sink = PlotSink()
+
 def add_intercept(x):
     """Add intercept to matrix x.
 
@@ -16,11 +109,132 @@ def add_intercept(x):
 
     return new_x
 
-def load_dataset(csv_path, add_intercept=True):
+def load_csv_array(csv_path, dtype=np.float64, cache=True):
+    """Read a numeric CSV file with one header row in a single pass.
+
+    With cache=True the parsed array is also written to a binary .npy
+    sidecar next to the CSV, keyed on the file's size, mtime and content
+    hash. Later calls memory-map the sidecar copy-on-write instead of
+    parsing the text again, so repeat runs start fast and share pages until
+    an array is modified.
+
+    Args:
+        csv_path: Path to CSV file.
+        dtype: Floating-point type of the returned array.
+        cache: Read from and write to the .npy sidecar cache.
+
+    Returns:
+        headers: List of column names.
+        data: Numpy array of shape (n_rows, n_columns). Writable whether or
+            not it comes from the cache; writes never reach the sidecar.
+    """
+    if cache:
+        cached = load_cached_array(csv_path, dtype)
+        if cached is not None:
+            return cached
+
+    with open(csv_path, 'r') as csv_fh:
+        headers = csv_fh.readline().strip().split(',')
+        data = parse_csv_text(csv_fh.read(), len(headers), dtype)
+
+    if cache:
+        save_cached_array(csv_path, dtype, headers, data)
+
+    return headers, data
+
+
+def parse_csv_text(text, n_columns, dtype=np.float64):
+    """Parse comma-separated numeric rows (no header) into a 2D array.
+
+    Like np.loadtxt, rejects rows without exactly n_columns fields and
+    fields that are not numbers, instead of silently shifting later rows.
+    """
+    lines = [line for line in text.splitlines() if line.strip()]
+    for i, line in enumerate(lines):
+        if line.count(',') != n_columns - 1:
+            raise ValueError('Invalid row {}: {!r} (expected {} columns)'
+                             .format(i + 1, line, n_columns))
+    data = np.fromstring(','.join(lines), dtype=dtype, sep=',')
+    if data.shape[0] != len(lines) * n_columns:
+        raise ValueError('Invalid CSV data: {} numbers parsed (expected {})'
+                         .format(data.shape[0], len(lines) * n_columns))
+    return data.reshape(-1, n_columns)
+
+
+def cache_paths(csv_path, dtype):
+    """Paths of the .npy sidecar and its JSON metadata for csv_path."""
+    prefix = '{}.{}'.format(csv_path, np.dtype(dtype).name)
+    return prefix + '.npy', prefix + '.json'
+
+
+def file_hash(path):
+    """SHA-1 of a file's contents, read in 1 MB blocks."""
+    sha = hashlib.sha1()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def load_cached_array(csv_path, dtype):
+    """Return (headers, data) from the sidecar cache, or None if it is stale.
+
+    Size and mtime are checked first. If only the mtime changed (e.g. after a
+    fresh checkout), the content hash decides whether the cache is reused.
+    """
+    npy_path, meta_path = cache_paths(csv_path, dtype)
+    try:
+        with open(meta_path, 'r') as meta_fh:
+            meta = json.load(meta_fh)
+        stat = os.stat(csv_path)
+        if meta['size'] != stat.st_size:
+            return None
+        if meta['mtime_ns'] != stat.st_mtime_ns:
+            if meta['sha1'] != file_hash(csv_path):
+                return None
+            meta['mtime_ns'] = stat.st_mtime_ns
+            write_atomic(meta_path, lambda fh: fh.write(json.dumps(meta).encode()))
+        data = np.load(npy_path, mmap_mode='c')
+    except (OSError, ValueError, KeyError):
+        return None
+
+    return meta['headers'], np.asarray(data)
+
+
+def save_cached_array(csv_path, dtype, headers, data):
+    """Write the .npy sidecar and its metadata, ignoring unwritable dirs."""
+    npy_path, meta_path = cache_paths(csv_path, dtype)
+    try:
+        stat = os.stat(csv_path)
+        meta = {'headers': headers, 'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns, 'sha1': file_hash(csv_path)}
+        write_atomic(npy_path, lambda fh: np.save(fh, data))
+        write_atomic(meta_path, lambda fh: fh.write(json.dumps(meta).encode()))
+    except OSError:
+        pass
+
+
+def write_atomic(path, write_fn):
+    """Call write_fn on a temporary file, then move it over path."""
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'wb') as fh:
+        write_fn(fh)
+    os.replace(tmp_path, path)
+
+
+def select_cols(data, cols):
+    """Return data[:, cols], as a view when cols are contiguous."""
+    if len(cols) > 0 and cols == list(range(cols[0], cols[-1] + 1)):
+        return data[:, cols[0]:cols[-1] + 1]
+    return data[:, cols]
+
+
+def load_dataset(csv_path, add_intercept=True, dtype=np.float64):
     """Load dataset from a CSV file.
 
     Args:
          csv_path: Path to CSV file containing dataset.
+         dtype: Floating-point type of the returned arrays (np.float32 or np.float64).
 
     Returns:
         xs: Numpy array of x-values (inputs).
@@ -31,18 +245,17 @@ def load_dataset(csv_path, add_intercept=True):
         global add_intercept
         return add_intercept(x)
 
-    # Load headers
-    with open(csv_path, 'r') as csv_fh:
-        headers = csv_fh.readline().strip().split(',')
+    # Load headers and values with a single read
+    headers, data = load_csv_array(csv_path, dtype)
 
-    # Load features and labels
+    # Split features and labels as column views
     x_cols = [i for i in range(len(headers)) if headers[i].startswith('x')]
     l_cols = [i for i in range(len(headers)) if headers[i].startswith('y')]
-    inputs = np.loadtxt(csv_path, delimiter=',', skiprows=1, usecols=x_cols)
-    labels = np.loadtxt(csv_path, delimiter=',', skiprows=1, usecols=l_cols)
+    inputs = select_cols(data, x_cols)
+    labels = select_cols(data, l_cols)
 
-    if inputs.ndim == 1:
-        inputs = np.expand_dims(inputs, -1)
+    if labels.shape[1] == 1:
+        labels = labels[:, 0]
 
     if add_intercept:
         inputs = add_intercept_fn(inputs)
@@ -50,6 +263,49 @@ def load_dataset(csv_path, add_intercept=True):
     return inputs, labels
 
 
+def iter_dataset(csv_path, chunk_size=10000, add_intercept=True, dtype=np.float64):
+    """Load dataset from a CSV file in fixed-size chunks of rows.
+
+    Only chunk_size rows are held in memory at a time, so multi-GB files can
+    be streamed into iterative solvers or prediction.
+
+    Args:
+         csv_path: Path to CSV file containing dataset.
+         chunk_size: Number of rows per chunk (the last chunk may be smaller).
+         add_intercept: Add an intercept entry to x-values of each chunk.
+         dtype: Floating-point type of the returned arrays (np.float32 or np.float64).
+
+    Yields:
+        xs: Numpy array of x-values (inputs) of the chunk.
+        ys: Numpy array of y-values (labels) of the chunk.
+    """
+
+    def add_intercept_fn(x):
+        global add_intercept
+        return add_intercept(x)
+
+    with open(csv_path, 'r') as csv_fh:
+        headers = csv_fh.readline().strip().split(',')
+        x_cols = [i for i in range(len(headers)) if headers[i].startswith('x')]
+        l_cols = [i for i in range(len(headers)) if headers[i].startswith('y')]
+
+        while True:
+            lines = list(itertools.islice(csv_fh, chunk_size))
+            if not lines:
+                break
+            data = parse_csv_text(''.join(lines), len(headers), dtype)
+            inputs = select_cols(data, x_cols)
+            labels = select_cols(data, l_cols)
+
+            if labels.shape[1] == 1:
+                labels = labels[:, 0]
+
+            if add_intercept:
+                inputs = add_intercept_fn(inputs)
+
+            yield inputs, labels
+
+
 def plot(x, y, theta, save_path):
     """Plot dataset and fitted logistic regression parameters.
 
@@ -58,7 +314,15 @@ def plot(x, y, theta, save_path):
         y: Vector of labels in {0, 1}.
         theta: Vector of parameters for logistic regression model.
         save_path: Path to save the plot.
+
+    The figure is drawn and saved by a background process so training can
+    continue; call plot_sink.flush() to wait for it (done at exit).
     """
+    plot_sink.submit(render_plot, x, y, theta, save_path)
+
+
+def render_plot(x, y, theta, save_path):
+    """Draw and save the figure for plot(). Runs in the plotting process."""
     # Plot dataset
     plt.figure()
     plt.plot(x[y == 1, -2], x[y == 1, -1], 'bx', linewidth=2, label='Class 1')
@@ -76,3 +340,4 @@ def plot(x, y, theta, save_path):
     plt.ylabel('x2')
     plt.legend()
     plt.savefig(save_path)
+    plt.close()
@@ -21,6 +21,8 @@ def main(train_path, valid_path, save_path):
     util.plot(x_eval, y_eval, clf.theta, save_path+'.eps')
     # Use np.savetxt to save outputs from validation set to save_path
     np.savetxt(save_path, (clf.predict(x_eval) > 0.5).astype(int))
+    # Wait for the background plot so rendering errors are raised here
+    util.plot_sink.flush()
     # *** END CODE HERE ***
 
 
@@ -47,6 +49,8 @@ class GDA:
         self.max_iter = max_iter
         self.eps = eps
         self.verbose = verbose
+        self.stats = None
+        self.stale = False
 
     def fit(self, x, y):
         """Fit a GDA model to training set given by x and y by updating
@@ -57,29 +61,58 @@ class GDA:
             y: Training example labels. Shape (n_examples,).
         """
         # *** START CODE HERE ***
-        def quadratic(x, A):
-            return np.dot(np.dot(x.T,A),x)
-        y = y.reshape([y.shape[0], 1])
-        # Find phi, mu_0, mu_1, and sigma
-        phi = np.mean(y)
-        mu_0 = np.transpose(np.sum(x * (y==0).astype(int), keepdims=True, axis=0)/np.sum((y==0))) # (d, 1)
-        mu_1 = np.transpose(np.sum(x * y, keepdims=True, axis=0)/np.sum(y)) # (d, 1)
-        sum = np.zeros((x.shape[1],x.shape[1]))
-        n_feature = x.shape[1]
-        for i in range(x.shape[0]):
-            if y[i]: mu = mu_1
-            else: mu = mu_0
-            vol_vector = x[i].reshape([n_feature, 1]) - mu
-            sum += np.dot(vol_vector, np.transpose(vol_vector))
-        sigma = 1 / x.shape[0] * sum
-        inv_sigma = np.linalg.inv(sigma)
+        self.stats = GDAStats(x.shape[1]).update(x, y)
+        self.fit_stats(self.stats)
+        # *** END CODE HERE ***
+
+    def fit_chunks(self, chunks):
+        """Fit a GDA model in one pass over an iterable of row chunks.
+
+        Args:
+            chunks: Iterable of (x_chunk, y_chunk) pairs.
+        """
+        # *** START CODE HERE ***
+        self.stats = None
+        for x_chunk, y_chunk in chunks:
+            if self.stats is None: self.stats = GDAStats(x_chunk.shape[1])
+            self.stats.update(x_chunk, y_chunk)
+        self.fit_stats(self.stats)
+        # *** END CODE HERE ***
+
+    def partial_fit(self, x, y):
+        """Update phi, the class means and the pooled covariance with a batch.
+
+        Each call costs O(n_examples * dim^2) regardless of how much data has
+        been seen. Theta is recomputed lazily on the next call to predict.
+
+        Args:
+            x: Batch of inputs. Shape (n_examples, dim).
+            y: Batch of labels. Shape (n_examples,).
+        """
+        # *** START CODE HERE ***
+        if self.stats is None: self.stats = GDAStats(x.shape[1])
+        self.stats.update(x, y)
+        self.stale = True
+        # *** END CODE HERE ***
+
+    def fit_stats(self, stats):
+        """Set self.theta from accumulated (possibly merged) GDAStats.
+
+        Args:
+            stats: GDAStats over the whole training set.
+        """
+        # *** START CODE HERE ***
+        self.stale = False
+        phi, mu_0, mu_1, sigma = stats.params()
         # Write theta in terms of the parameters
-        theta_1 = np.transpose(np.dot(np.transpose(mu_1-mu_0), inv_sigma)).reshape(2)
-        theta_0 = 1/2 * (quadratic(mu_0, inv_sigma) - quadratic(mu_1, inv_sigma)) + np.log((1 - phi)/phi)
-        # Store theta in such a manner: (theta_0, theta_1[0], theta_1[1]).T
-        self.theta = np.zeros((theta_1.shape[0]+1,1))
-        self.theta[0,0] = theta_0
-        self.theta[1:,0] = theta_1
+        theta_1 = np.linalg.solve(sigma, mu_1 - mu_0)
+        theta_0 = 0.5 * (np.dot(mu_0, np.linalg.solve(sigma, mu_0))
+                         - np.dot(mu_1, np.linalg.solve(sigma, mu_1))) \
+            + np.log(phi / (1 - phi))
+        # Store theta in such a manner: (theta_0, theta_1[0], ..., theta_1[d-1]).T
+        self.theta = np.zeros((theta_1.shape[0] + 1, 1))
+        self.theta[0, 0] = theta_0
+        self.theta[1:, 0] = theta_1
         # *** END CODE HERE ***
 
     def predict(self, x):
@@ -101,10 +134,74 @@ class GDA:
         def h(theta, x):
             return sigmoid(g(theta, x))
 
+        if self.stale: self.fit_stats(self.stats)
         predicts = h(self.theta, x)
         return predicts
         # *** END CODE HERE
 
+
+class GDAStats:
+    """Per-class sufficient statistics for GDA.
+
+    Holds the count, mean and centered scatter matrix (sum of
+    (x - mu)(x - mu)^T) of each class. Chunks are folded in with Chan's
+    parallel form of Welford's update, which stays numerically stable no
+    matter how much data has been seen, and statistics computed on separate
+    shards (e.g. in parallel workers) merge exactly the same way.
+
+    Example usage:
+        > stats = GDAStats(dim).update(x_shard_1, y_shard_1)
+        > stats.merge(GDAStats(dim).update(x_shard_2, y_shard_2))
+        > clf.fit_stats(stats)
+    """
+    def __init__(self, dim):
+        """
+        Args:
+            dim: Number of input features.
+        """
+        self.count = np.zeros(2)
+        self.mean = np.zeros((2, dim))
+        self.scatter = np.zeros((2, dim, dim))
+
+    def update(self, x, y):
+        """Add a chunk of rows in O(n_examples * dim^2). Returns self.
+
+        Args:
+            x: Inputs of shape (n_examples, dim).
+            y: Labels in {0, 1} of shape (n_examples,).
+        """
+        y = y.reshape(-1)
+        for c in range(2):
+            x_c = x[y == c]
+            if x_c.shape[0] == 0: continue
+            mean_c = np.mean(x_c, axis=0)
+            centered = x_c - mean_c
+            self.combine(c, x_c.shape[0], mean_c, np.dot(centered.T, centered))
+        return self
+
+    def merge(self, other):
+        """Add the statistics of another shard. Returns self."""
+        for c in range(2):
+            if other.count[c] == 0: continue
+            self.combine(c, other.count[c], other.mean[c], other.scatter[c])
+        return self
+
+    def combine(self, c, count, mean, scatter):
+        """Chan et al. update of class c with another group's statistics."""
+        n = self.count[c] + count
+        delta = mean - self.mean[c]
+        self.mean[c] += delta * (count / n)
+        self.scatter[c] += scatter + np.outer(delta, delta) * (self.count[c] * count / n)
+        self.count[c] = n
+
+    def params(self):
+        """Return the maximum likelihood phi, mu_0, mu_1 and shared sigma."""
+        n = np.sum(self.count)
+        phi = self.count[1] / n
+        sigma = np.sum(self.scatter, axis=0) / n
+        return phi, self.mean[0], self.mean[1], sigma
+
+
 if __name__ == '__main__':
     main(train_path='ds1_train.csv',
          valid_path='ds1_valid.csv',
@@ -1,5 +1,9 @@
+import contextlib
+import multiprocessing
+
 import numpy as np
 import util
+from scipy import linalg
 
 
 def main(train_path, valid_path, save_path):
@@ -21,6 +25,8 @@ def main(train_path, valid_path, save_path):
     util.plot(x_eval, y_eval, clf.theta, save_path+'.eps')
     # Use np.savetxt to save predictions on eval set to save_path
     np.savetxt(save_path, (clf.predict(x_eval)>0.5).astype(int), fmt='%i')
+    # Wait for the background plot so rendering errors are raised here
+    util.plot_sink.flush()
     # *** END CODE HERE ***
 
 
@@ -34,7 +40,7 @@ class LogisticRegression:
     """
 
     def __init__(self, step_size=0.01, max_iter=1000000, eps=1e-5,
-                 theta_0=None, verbose=True):
+                 theta_0=None, verbose=True, l2=0., n_jobs=1, class_weight=None):
         """
         Args:
             step_size: Step size for iterative solvers only.
@@ -42,67 +48,175 @@ class LogisticRegression:
             eps: Threshold for determining convergence.
             theta_0: Initial guess for theta. If None, use the zero vector.
             verbose: Print loss values during training.
+            l2: Strength of the L2 penalty 0.5 * l2 * ||theta[1:]||^2. The
+                intercept theta[0] is not penalized.
+            n_jobs: Number of worker processes for the Newton solver. With more
+                than one, rows are sharded across a process pool and each
+                worker returns partial gradient and Hessian sums.
+            class_weight: None, a dict mapping each label (0, 1) to a weight,
+                or 'balanced' to weight label c by n_examples / (2 * n_c).
+                Multiplies any sample_weight passed to fit.
         """
+        # Validate class_weight argument
+        if not (class_weight is None or class_weight == 'balanced'
+                or isinstance(class_weight, dict)):
+            raise ValueError('Invalid class_weight: {} (expected {})'
+                             .format(class_weight, "None, 'balanced' or dict"))
+
         self.theta = theta_0
         self.step_size = step_size
         self.max_iter = max_iter
         self.eps = eps
         self.verbose = verbose
+        self.l2 = l2
+        self.n_jobs = n_jobs
+        self.class_weight = class_weight
 
-    def fit(self, x, y):
+    def fit(self, x, y, sample_weight=None):
         """Run Newton's Method to minimize J(theta) for logistic regression.
 
         Args:
             x: Training example inputs. Shape (n_examples, dim).
             y: Training example labels. Shape (n_examples,).
+            sample_weight: Optional per-example weights. Shape (n_examples,).
+                A weight of m is equivalent to repeating the row m times.
         """
 
         # *** START CODE HERE ***
-        # theta dot x
-        def g(theta, x):
-            return np.dot(x, theta)
-
-        # sigmoid
-        def sigmoid(z):
-            return 1 / (1 + np.exp(-z))
-
-        # predictions of y
-        def h(theta, x):
-            return sigmoid(g(theta, x))
-
-        # log-likelihood function
-        def logLikelihood(theta, x, y):
-            return np.sum(y * np.log(h(theta, x)) + (1 - y) * np.log(h(-theta, x)))
-
-        # nabla log-likelihood
-        def first_derivative(theta, x, y):
-            return np.dot(np.transpose(x), y - h(theta, x))
-
-        # nabla square log-likelihood
-        def hessian(theta, x):
-            n = x.shape[0]
-            d = np.zeros((n, n))
-            hx = h(theta, x)
-            for i in range(n):
-                d[i][i] = hx[i]
-            return np.dot(np.transpose(x), np.dot(d, x))
-
         # Initializing theta
         if self.theta is None: self.theta = np.zeros(shape=[x.shape[1], 1])
         # Reshape y
         y = y.reshape(y.shape[0], 1)
+        w = example_weights(y, sample_weight, self.class_weight)
         # Main update iteration
+        with derivatives_fn(x, y, self.n_jobs, w) as derivatives:
+            self.run_newton(derivatives)
+        # *** END CODE HERE ***
+
+    def run_newton(self, derivatives):
+        """Run Newton's Method from self.theta.
+
+        Args:
+            derivatives: Function mapping theta to (gradient, hessian,
+                log-likelihood), as yielded by derivatives_fn. The loss printed
+                for an iteration is the one at the start of that iteration.
+        """
         for i in range(self.max_iter):
-            print('Iteration ', i)
-            delta_theta = np.dot(np.linalg.inv(hessian(self.theta, x)), first_derivative(self.theta, x, y))
+            if self.verbose:
+                print('Iteration ', i)
+            grad, hess, ll = derivatives(self.theta)
+            if self.l2:
+                penalty = np.full(self.theta.shape[0], self.l2)
+                penalty[0] = 0.
+                grad -= penalty.reshape(-1, 1) * self.theta
+                hess += np.diag(penalty)
+            delta_theta = newton_step(hess, grad)
             updateValue = np.linalg.norm(delta_theta)
             self.theta += delta_theta
             if self.verbose:
-                J = -logLikelihood(self.theta, x, y)
-                print('Loss of iteration {} is {}'.format(i, round(J, 5)))
+                print('Loss of iteration {} is {}'.format(i, round(-ll, 5)))
             # Break if updates too small
             if updateValue < self.eps:
                 break
+
+    def fit_path(self, x, y, lambdas, sample_weight=None):
+        """Fit a path of L2-regularized models, warm-starting each from the last.
+
+        The lambdas are visited from strongest to weakest, so every fit starts
+        from a nearby solution and only needs a few Newton steps. With
+        n_jobs > 1 the worker pool and shared buffers are set up once for the
+        whole path. Every lambda
+        is fitted: a small change of theta between neighbouring lambdas does
+        not mean the path has settled (theta stays near zero across all of the
+        strongly regularized end), so no lambda is skipped.
+
+        Args:
+            x: Training example inputs. Shape (n_examples, dim).
+            y: Training example labels. Shape (n_examples,).
+            lambdas: Sequence of L2 strengths.
+            sample_weight: Optional per-example weights, as in fit.
+
+        Returns:
+            lambdas: The L2 strengths, sorted in decreasing order.
+            thetas: Fitted parameters for each lambda. Shape (n_lambdas, dim, 1).
+        """
+        # *** START CODE HERE ***
+        lambdas = np.sort(np.asarray(lambdas, dtype=float))[::-1]
+        thetas = np.zeros((lambdas.shape[0], x.shape[1], 1))
+        if self.theta is None: self.theta = np.zeros(shape=[x.shape[1], 1])
+        y = y.reshape(y.shape[0], 1)
+        w = example_weights(y, sample_weight, self.class_weight)
+        with derivatives_fn(x, y, self.n_jobs, w) as derivatives:
+            for i, l2 in enumerate(lambdas):
+                self.l2 = l2
+                self.run_newton(derivatives)
+                thetas[i] = self.theta
+        return lambdas, thetas
+        # *** END CODE HERE ***
+
+    def partial_fit(self, x, y):
+        """Take one mini-batch gradient ascent step on a chunk of rows.
+
+        Only theta is kept between calls, so the full dataset never has to be
+        in memory. Uses self.step_size on the mean gradient of the chunk's
+        objective: the weighted log-likelihood minus the L2 penalty, so a
+        chunk holding every row has the same optimum as fit. A dict
+        class_weight is applied; 'balanced' needs the class counts of the
+        whole dataset and is rejected.
+
+        Args:
+            x: Chunk of training inputs. Shape (chunk_size, dim).
+            y: Chunk of training labels. Shape (chunk_size,).
+
+        Returns:
+            Norm of the update applied to theta.
+        """
+        # *** START CODE HERE ***
+        if self.class_weight == 'balanced':
+            raise ValueError('Invalid class_weight: balanced (expected {} for '
+                             'partial_fit)'.format("None or dict"))
+        if self.theta is None: self.theta = np.zeros(shape=[x.shape[1], 1])
+        y = y.reshape(y.shape[0], 1)
+        w = example_weights(y, None, self.class_weight)
+        hx = h(self.theta, x)
+        grad = gradient(x, y, hx, w)
+        if self.l2:
+            penalty = np.full((x.shape[1], 1), self.l2)
+            penalty[0] = 0.
+            grad -= penalty * self.theta
+        delta_theta = self.step_size * grad / x.shape[0]
+        self.theta += delta_theta
+        return np.linalg.norm(delta_theta)
+        # *** END CODE HERE ***
+
+    def fit_stream(self, chunks):
+        """Run one pass of mini-batch gradient ascent over row chunks.
+
+        Every chunk is consumed: a small update on one mini-batch says nothing
+        about convergence, so the decision is left to the caller.
+
+        Args:
+            chunks: Iterable of (x_chunk, y_chunk) pairs, e.g. a generator
+                reading the rows of a file that does not fit in memory. Make
+                several passes by calling this again with a fresh iterable.
+
+        Returns:
+            Norm of the change of theta over the whole pass. Stop making
+            passes once it is below self.eps.
+        """
+        # *** START CODE HERE ***
+        theta_start = None if self.theta is None else self.theta.copy()
+        for i, (x_chunk, y_chunk) in enumerate(chunks):
+            self.partial_fit(x_chunk, y_chunk)
+            if theta_start is None: theta_start = np.zeros_like(self.theta)
+            if self.verbose:
+                y_col = y_chunk.reshape(-1, 1)
+                w = example_weights(y_col, None, self.class_weight)
+                J = -log_likelihood(self.theta, x_chunk, y_col, w)
+                print('Loss of chunk {} is {}'.format(i, round(J / x_chunk.shape[0], 5)))
+        if theta_start is None:
+            return 0.
+        return np.linalg.norm(self.theta - theta_start)
         # *** END CODE HERE ***
 
     def predict(self, x):
@@ -116,17 +230,226 @@ class LogisticRegression:
         """
 
         # *** START CODE HERE ***
-        def g(theta, x):
-            return np.dot(x, theta)
+        return h(self.theta, x).reshape(x.shape[0])
+        # *** END CODE HERE ***
 
-        def sigmoid(z):
-            return 1 / (1 + np.exp(-z))
 
-        def h(theta, x):
-            return sigmoid(g(theta, x))
+# *** START CODE HERE ***
+# Helper functions
+def sigmoid(z):
+    return 1 / (1 + np.exp(-z))
 
-        return h(self.theta, x).reshape(x.shape[0])
-        # *** END CODE HERE ***
+
+def h(theta, x):
+    """Predicted probabilities sigmoid(x theta), shape (n_examples, 1)."""
+    return sigmoid(np.matmul(x, theta))
+
+
+def log_likelihood(theta, x, y, w=None):
+    """Log-likelihood sum(y z - log(1 + e^z)) with z = x theta.
+
+    Written with np.logaddexp so it stays finite when the probabilities
+    saturate to 0 or 1.
+    """
+    z = np.matmul(x, theta)
+    ll = y * z - np.logaddexp(0, z)
+    if w is not None: ll = w * ll
+    return np.sum(ll)
+
+
+def example_weights(y, sample_weight=None, class_weight=None):
+    """Per-example weights of shape (n_examples, 1), or None if unweighted.
+
+    Args:
+        y: Labels. Shape (n_examples, 1).
+        sample_weight: None or weights of shape (n_examples,).
+        class_weight: None, 'balanced' or a dict mapping label to weight.
+    """
+    if sample_weight is None and class_weight is None:
+        return None
+    w = np.ones((y.shape[0], 1))
+    if sample_weight is not None:
+        w *= np.asarray(sample_weight, dtype=float).reshape(-1, 1)
+    if class_weight == 'balanced':
+        n_pos = np.sum(y == 1)
+        if n_pos == 0 or n_pos == y.shape[0]:
+            raise ValueError('Invalid class_weight: balanced (expected {})'
+                             .format('both labels present in y'))
+        class_weight = {1: y.shape[0] / (2. * n_pos),
+                        0: y.shape[0] / (2. * (y.shape[0] - n_pos))}
+    if class_weight is not None:
+        w *= np.where(y == 1, class_weight.get(1, 1.), class_weight.get(0, 1.))
+    return w
+
+
+def gradient(x, y, hx, w=None):
+    """Gradient of the log-likelihood, X^T W (y - h). Shape (dim, 1).
+
+    w holds the diagonal of W (shape (n_examples, 1)); None means W = I.
+    """
+    r = y - hx
+    if w is not None: r = w * r
+    return np.matmul(np.swapaxes(x, -1, -2), r)
+
+
+def hessian(x, hx, w=None):
+    """Negative Hessian of the log-likelihood, X^T D X with D = W diag(h(1 - h)).
+
+    D is never materialized: the rows of x are scaled by the diagonal instead,
+    so this costs O(n_examples * dim^2) time and O(dim^2) memory.
+    """
+    d = hx * (1 - hx)
+    if w is not None: d = w * d
+    return np.matmul(np.swapaxes(x, -1, -2), x * d)
+
+
+def newton_step(hess, grad):
+    """Solve hess * delta = grad by Cholesky factorization.
+
+    Falls back to least squares when hess is not positive definite (e.g. the
+    probabilities have saturated on separable data).
+    """
+    try:
+        return linalg.cho_solve(linalg.cho_factor(hess), grad)
+    except np.linalg.LinAlgError:
+        return np.linalg.lstsq(hess, grad, rcond=None)[0]
+
+
+@contextlib.contextmanager
+def derivatives_fn(x, y, n_jobs=1, w=None):
+    """Yield a function mapping theta to (gradient, hessian, log-likelihood)
+    on (x, y).
+
+    w is an optional column of example weights, as returned by
+    example_weights. With n_jobs > 1, x, y and w are copied once into
+    shared memory and the rows
+    are split into n_jobs contiguous shards. Each call then sends only theta
+    to the workers and sums the partial gradients, Hessians and
+    log-likelihoods they return.
+    The pool is shut down when the context exits.
+    """
+    if n_jobs <= 1:
+        def derivatives(theta):
+            return derivative_terms(theta, x, y, w)
+        yield derivatives
+        return
+
+    x_shared = multiprocessing.RawArray('d', x.size)
+    y_shared = multiprocessing.RawArray('d', y.size)
+    np.frombuffer(x_shared).reshape(x.shape)[:] = x
+    np.frombuffer(y_shared).reshape(y.shape[0], 1)[:] = y.reshape(-1, 1)
+    w_shared = None
+    if w is not None:
+        w_shared = multiprocessing.RawArray('d', w.size)
+        np.frombuffer(w_shared).reshape(w.shape)[:] = w
+    bounds = np.linspace(0, x.shape[0], n_jobs + 1).astype(int)
+    shards = list(zip(bounds[:-1], bounds[1:]))
+
+    def derivatives(theta):
+        parts = pool.map(shard_derivatives,
+                         [(theta, start, stop) for start, stop in shards])
+        return tuple(sum(p[k] for p in parts) for k in range(3))
+
+    pool = multiprocessing.Pool(n_jobs, initializer=init_worker,
+                                initargs=(x_shared, y_shared, w_shared, x.shape))
+    try:
+        yield derivatives
+    finally:
+        pool.close()
+        pool.join()
+
+
+def init_worker(x_shared, y_shared, w_shared, shape):
+    """Wrap the shared buffers as arrays once per worker process."""
+    global worker_x, worker_y, worker_w
+    worker_x = np.frombuffer(x_shared).reshape(shape)
+    worker_y = np.frombuffer(y_shared).reshape(shape[0], 1)
+    worker_w = None
+    if w_shared is not None:
+        worker_w = np.frombuffer(w_shared).reshape(shape[0], 1)
+
+
+def shard_derivatives(args):
+    """Partial gradient, Hessian and log-likelihood sums over rows
+    [start, stop)."""
+    theta, start, stop = args
+    x, y = worker_x[start:stop], worker_y[start:stop]
+    w = None if worker_w is None else worker_w[start:stop]
+    return derivative_terms(theta, x, y, w)
+
+
+def derivative_terms(theta, x, y, w=None):
+    """Gradient, negative Hessian and log-likelihood at theta on (x, y)."""
+    hx = h(theta, x)
+    return gradient(x, y, hx, w), hessian(x, hx, w), log_likelihood(theta, x, y, w)
+
+
+def fit_batched(xs, ys, max_iter=1000000, eps=1e-5, verbose=False):
+    """Fit many independent logistic regressions of the same dim at once.
+
+    Problems are grouped into buckets whose sizes n_b are within a factor of
+    two, and each bucket is zero-padded to its largest n_b (zero rows
+    contribute nothing to the gradient or the Hessian). Padding therefore at
+    most doubles memory, O(sum(n_b) * dim), however uneven the n_b are. Each
+    Newton iteration forms the gradients and Hessians of the unconverged
+    problems of a bucket with batched matmul as (B_k, dim, 1) and
+    (B_k, dim, dim) arrays and solves them with one batched np.linalg.solve.
+
+    Args:
+        xs: Sequence of B input matrices, each of shape (n_b, dim).
+        ys: Sequence of B label vectors, each of shape (n_b,).
+        max_iter: Maximum number of Newton iterations.
+        eps: Threshold on the update norm for determining convergence.
+        verbose: Print the number of unconverged problems per iteration.
+
+    Returns:
+        thetas: Array of shape (B, dim, 1); thetas[b] can be passed as
+            theta_0 to LogisticRegression or assigned to clf.theta. Problems
+            without rows keep theta = 0.
+    """
+    dim = xs[0].shape[1]
+    sizes = np.array([x.shape[0] for x in xs])
+    thetas = np.zeros((len(xs), dim, 1))
+
+    buckets = []
+    nonempty = np.nonzero(sizes > 0)[0]
+    keys = np.ceil(np.log2(sizes[nonempty])).astype(int)
+    for key in np.unique(keys):
+        members = nonempty[keys == key]
+        n = sizes[members].max()
+        x_pad = np.zeros((members.shape[0], n, dim))
+        y_pad = np.zeros((members.shape[0], n, 1))
+        for b, problem in enumerate(members):
+            x_pad[b, :sizes[problem]] = xs[problem]
+            y_pad[b, :sizes[problem], 0] = ys[problem]
+        buckets.append((members, x_pad, y_pad))
+
+    for i in range(max_iter):
+        if not buckets:
+            break
+        if verbose:
+            n_active = sum(members.shape[0] for members, _, _ in buckets)
+            print('Iteration {}: {} problems left'.format(i, n_active))
+        next_buckets = []
+        for members, x, y in buckets:
+            hx = sigmoid(np.matmul(x, thetas[members]))
+            x_t = np.swapaxes(x, 1, 2)
+            grad = np.matmul(x_t, y - hx)
+            hess = np.matmul(x_t, x * (hx * (1 - hx)))
+            try:
+                delta_theta = np.linalg.solve(hess, grad)
+            except np.linalg.LinAlgError:
+                delta_theta = np.matmul(np.linalg.pinv(hess), grad)
+            thetas[members] += delta_theta
+            # Drop problems whose updates are too small
+            keep = np.linalg.norm(delta_theta[:, :, 0], axis=1) >= eps
+            if np.all(keep):
+                next_buckets.append((members, x, y))
+            elif np.any(keep):
+                next_buckets.append((members[keep], x[keep], y[keep]))
+        buckets = next_buckets
+    return thetas
+# *** END CODE HERE ***
 
 
 if __name__ == '__main__':
@@ -1,6 +1,6 @@
 import numpy as np
 import util
-import matplotlib.pyplot as plt
+from scipy import linalg, special
 
 def main(lr, train_path, eval_path, save_path):
     """Problem: Poisson regression with gradient ascent.
@@ -33,7 +33,7 @@ class PoissonRegression:
     """
 
     def __init__(self, step_size=1e-5, max_iter=10000000, eps=1e-5,
-                 theta_0=None, verbose=True):
+                 theta_0=None, verbose=True, solver='gradient', loss_every=100):
         """
         Args:
             step_size: Step size for iterative solvers only.
@@ -41,37 +41,41 @@ class PoissonRegression:
             eps: Threshold for determining convergence.
             theta_0: Initial guess for theta. If None, use the zero vector.
             verbose: Print loss values during training.
+            solver: 'gradient' for fixed-step gradient ascent, 'newton' for
+                Newton's method (IRLS) with step halving, or 'accelerated' for
+                Nesterov-accelerated gradient ascent with backtracking line
+                search (O(n_examples * dim) per iteration, for large dim).
+            loss_every: Evaluate (and print) the loss every loss_every
+                iterations and at convergence.
         """
+        # Validate solver argument
+        allowed_solvers = ('gradient', 'newton', 'accelerated')
+        if solver not in allowed_solvers:
+            raise ValueError('Invalid solver: {} (expected {})'
+                             .format(solver, allowed_solvers))
+
         self.theta = theta_0
         self.step_size = step_size
         self.max_iter = max_iter
         self.eps = eps
         self.verbose = verbose
+        self.solver = solver
+        self.loss_every = loss_every
 
-    def fit(self, x, y):
-        """Run gradient ascent to maximize likelihood for Poisson regression.
+    def fit(self, x, y, callback=None):
+        """Run the solver to maximize likelihood for Poisson regression.
 
         Args:
             x: Training example inputs. Shape (n_examples, dim).
             y: Training example labels. Shape (n_examples,).
+            callback: Optional function called as callback(i, theta, loss)
+                after every iteration, where loss() evaluates the current
+                loss on demand. Returning True stops training.
         """
         # *** START CODE HERE ***
-        # eta
-        def g(theta, x):
-            return np.dot(x, theta)
-
-        # predictions of y
-        def h(theta, x):
-            return np.exp(g(theta, x))
-
-        fac = lambda x: np.math.factorial(x)
-
-        # loss function
-        def loss(theta, x, y):
-            eta = g(theta, x)
-            lambd = np.exp(eta)
-            factorials = np.array(list(map(fac, y))).reshape([y.shape[0],1]).astype('float')
-            return np.mean(np.log(factorials) + lambd - eta * y)
+        # loss function (mean negative log-likelihood)
+        def loss():
+            return (log_y_fact - log_likelihood(self.theta, x, y)) / n
 
         # l2 loss
         def l2loss(theta, x, y):
@@ -82,16 +86,25 @@ class PoissonRegression:
         if self.theta is None: self.theta = np.zeros((dim,1))
         # reshape y
         y = y.reshape([y.shape[0],1])
+        # constant log(y!) term, computed once for the dataset
+        log_y_fact = np.sum(special.gammaln(y + 1))
+        if self.solver == 'accelerated':
+            ascent = AcceleratedAscent(self.step_size)
         for i in range(self.max_iter):
             lambd = h(self.theta, x)
-            updateVector = self.step_size * (np.dot(x.transpose(), (y - lambd)))
-            updateVector = self.step_size * (np.dot(x.transpose(), (y - lambd)))
+            if self.solver == 'newton':
+                updateVector = irls_step(self.theta, x, y, lambd)
+            elif self.solver == 'accelerated':
+                updateVector = ascent.step(self.theta, x, y, lambd)
+            else:
+                updateVector = self.step_size * (np.dot(x.transpose(), (y - lambd)))
             self.theta += updateVector
             updateValue = np.linalg.norm(updateVector)
-            J = loss(self.theta, x, y)
-            if self.verbose:
-                print('loss of iteration {} is {}'.format(i, round(J, 5)))
-            if updateValue < self.eps: break
+            converged = updateValue < self.eps
+            if self.verbose and (converged or i % self.loss_every == 0):
+                print('loss of iteration {} is {}'.format(i, round(loss(), 5)))
+            if callback is not None and callback(i, self.theta, loss): break
+            if converged: break
         # *** END CODE HERE ***
 
     def predict(self, x):
@@ -104,16 +117,107 @@ class PoissonRegression:
             Floating-point prediction for each input, shape (n_examples,).
         """
         # *** START CODE HERE ***
-        def g(theta, x):
-            return np.dot(x, theta)
-
-        # predictions of y
-        def h(theta, x):
-            return np.exp(g(theta, x))
-
         return h(self.theta, x)
         # *** END CODE HERE ***
 
+
+# *** START CODE HERE ***
+# Helper functions
+# eta
+def g(theta, x):
+    return np.dot(x, theta)
+
+
+# predictions of y
+def h(theta, x):
+    return np.exp(g(theta, x))
+
+
+def log_likelihood(theta, x, y):
+    """Poisson log-likelihood without the constant -sum(log(y!)) term."""
+    eta = g(theta, x)
+    with np.errstate(over='ignore'):
+        return np.sum(y * eta - np.exp(eta))
+
+
+def irls_step(theta, x, y, lambd, max_halvings=30):
+    """Newton (IRLS) update for theta, halved until the likelihood improves.
+
+    Solves (X^T W X) delta = X^T (y - lambda) with W = diag(lambda) by Cholesky
+    factorization, forming X^T W X by scaling rows instead of building W.
+    """
+    grad = np.dot(x.transpose(), y - lambd)
+    hess = np.dot(x.transpose(), x * lambd)
+    try:
+        delta = linalg.cho_solve(linalg.cho_factor(hess), grad)
+    except np.linalg.LinAlgError:
+        delta = np.linalg.lstsq(hess, grad, rcond=None)[0]
+    # Step halving: shrink the step while it decreases the likelihood
+    ll = log_likelihood(theta, x, y)
+    for _ in range(max_halvings):
+        if log_likelihood(theta + delta, x, y) >= ll:
+            break
+        delta = delta / 2
+    return delta
+
+
+class AcceleratedAscent(object):
+    """Nesterov-accelerated gradient ascent with backtracking line search.
+
+    Holds the momentum between calls to step(). Each iteration first tries a
+    step twice as long as the last accepted one, then halves it until the
+    sufficient-increase condition holds, so step_size is only a starting
+    guess. Momentum is reset whenever it would lower the likelihood
+    (adaptive restart). Every iteration costs a few O(n_examples * dim)
+    passes over x.
+    """
+    def __init__(self, step_size):
+        """
+        Args:
+            step_size: Initial step size for the line search.
+        """
+        self.step_size = step_size
+        self.t = 1.
+        self.prev_theta = None
+
+    def step(self, theta, x, y, lambd):
+        """Return the update to apply to theta.
+
+        Args:
+            theta: Current parameters. Shape (dim, 1).
+            x: Training example inputs. Shape (n_examples, dim).
+            y: Training example labels. Shape (n_examples, 1).
+            lambd: Predictions h(theta, x). Shape (n_examples, 1).
+        """
+        if self.prev_theta is None: self.prev_theta = theta.copy()
+        ll = log_likelihood(theta, x, y)
+        t_next = (1 + np.sqrt(1 + 4 * self.t ** 2)) / 2
+        z = theta + ((self.t - 1) / t_next) * (theta - self.prev_theta)
+        new_theta = self.line_search(z, x, y)
+        if log_likelihood(new_theta, x, y) < ll:
+            # Restart momentum from theta itself
+            t_next = 1.
+            new_theta = self.line_search(theta, x, y, lambd)
+        self.prev_theta = theta.copy()
+        self.t = t_next
+        return new_theta - theta
+
+    def line_search(self, z, x, y, lambd=None, max_halvings=50):
+        """Backtracking gradient step from z."""
+        if lambd is None: lambd = h(z, x)
+        grad = np.dot(x.transpose(), y - lambd)
+        ll_z = log_likelihood(z, x, y)
+        grad_sq = np.sum(grad ** 2)
+        step_size = 2 * self.step_size
+        for _ in range(max_halvings):
+            candidate = z + step_size * grad
+            if log_likelihood(candidate, x, y) >= ll_z + 0.5 * step_size * grad_sq:
+                break
+            step_size /= 2
+        self.step_size = step_size
+        return candidate
+# *** END CODE HERE ***
+
 if __name__ == '__main__':
     main(lr=1e-5,
         train_path='train.csv',
@@ -1,7 +1,28 @@
 import numpy as np
 import ast
 import pandas as pd
-import matplotlib.pyplot as plt
+import os
+import sys
+
+
+class LazyPyplot(object):
+    """matplotlib.pyplot, imported on first use.
+
+    Training and prediction never pay for the import. The non-interactive Agg
+    backend is selected when no display is available, so headless runs never
+    load a GUI toolkit.
+    """
+    def __getattr__(self, name):
+        if 'matplotlib.pyplot' not in sys.modules:
+            import matplotlib
+            headless = not (os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+            if os.name == 'posix' and sys.platform != 'darwin' and headless:
+                matplotlib.use('Agg')
+        import matplotlib.pyplot
+        return getattr(matplotlib.pyplot, name)
+
+
+plt = LazyPyplot()
 
 # Scaling for lambda to plot
 scale_list = [0, 0.03125, 0.0625, 0.125, 0.25, 0.5, 1, 2, 4]
@@ -1,26 +1,218 @@
+import collections
 import math
 
-import matplotlib.pyplot as plt
 import numpy as np
 
 import util
+from util import plt
 
 
-def initial_state():
+def initial_state(features=None, max_support_vectors=None, eviction='oldest'):
     """Return the initial state for the perceptron.
 
     This function computes and then returns the initial state of the perceptron.
     Feel free to use any data type (dicts, lists, tuples, or custom classes) to
     contain the state of the perceptron.
 
+    Args:
+        features: Optional RandomFourierFeatures. If given, the perceptron
+            runs in the primal on these features (pass the same object as
+            the kernel to update_state and predict).
+        max_support_vectors: Optional budget on the number of stored support
+            vectors, to bound memory and prediction cost on long streams.
+        eviction: How to make room once the budget is reached; see
+            PerceptronState.
     """
 
     # *** START CODE HERE ***
     # Return an empty state
-    return []
+    if features is not None:
+        return FourierState(features)
+    return PerceptronState(max_support_vectors=max_support_vectors,
+                           eviction=eviction)
     # *** END CODE HERE ***
 
 
+class PerceptronState(object):
+    """Support vectors and their coefficients for the kernel perceptron.
+
+    Only examples with a nonzero beta (i.e. mistakes) are stored, in a
+    preallocated matrix whose capacity doubles when full, so memory and
+    prediction cost grow with the number of mistakes. Iterating yields
+    (x_i, beta) pairs.
+
+    With max_support_vectors set, adding to a full state first makes room
+    according to eviction:
+        'oldest': drop the support vector added first.
+        'smallest': drop the support vector with the smallest |beta|.
+        'random': drop a uniformly random support vector.
+        'merge': fold the new vector into the nearest stored one with a beta
+            of the same sign (beta-weighted mean of the two vectors, summed
+            beta); if there is none, drop the smallest |beta| instead.
+    """
+
+    def __init__(self, capacity=64, max_support_vectors=None, eviction='oldest',
+                 seed=0):
+        """
+        Args:
+            capacity: Initial number of support vector rows to allocate.
+            max_support_vectors: Maximum number of stored support vectors, or
+                None for no limit.
+            eviction: Policy for a full state: 'oldest', 'smallest', 'random'
+                or 'merge'.
+            seed: Seed for the 'random' policy.
+        """
+        # Validate eviction argument
+        allowed_evictions = ('oldest', 'smallest', 'random', 'merge')
+        if eviction not in allowed_evictions:
+            raise ValueError('Invalid eviction: {} (expected {})'
+                             .format(eviction, allowed_evictions))
+        # Validate max_support_vectors argument
+        if max_support_vectors is not None and not (
+                isinstance(max_support_vectors, (int, np.integer))
+                and max_support_vectors >= 1):
+            raise ValueError('Invalid max_support_vectors: {} (expected {})'
+                             .format(max_support_vectors, 'None or an int >= 1'))
+
+        if max_support_vectors is not None:
+            capacity = min(capacity, max_support_vectors)
+        self.capacity = capacity
+        self.max_support_vectors = max_support_vectors
+        self.eviction = eviction
+        self.rng = np.random.RandomState(seed)
+        self.size = 0
+        self.count = 0
+        self.support = None
+        self.beta = np.zeros(capacity)
+        self.age = np.zeros(capacity, dtype=int)
+
+    @property
+    def vectors(self):
+        """Stored support vectors. Shape (size, dim)."""
+        if self.support is None: return np.zeros((0, 0))
+        return self.support[:self.size]
+
+    @property
+    def betas(self):
+        """Coefficients of the stored support vectors. Shape (size,)."""
+        return self.beta[:self.size]
+
+    def add(self, x_i, beta):
+        """Append support vector x_i with coefficient beta, unless beta is 0."""
+        if beta == 0:
+            return
+        if self.support is None:
+            self.support = np.zeros((self.capacity, np.shape(x_i)[0]))
+        elif self.size == self.max_support_vectors:
+            if self.eviction == 'merge' and self.merge(x_i, beta):
+                return
+            self.evict()
+        elif self.size == self.capacity:
+            self.capacity *= 2
+            if self.max_support_vectors is not None:
+                self.capacity = min(self.capacity, self.max_support_vectors)
+            support = np.zeros((self.capacity, self.support.shape[1]))
+            support[:self.size] = self.support
+            betas = np.zeros(self.capacity)
+            betas[:self.size] = self.beta
+            age = np.zeros(self.capacity, dtype=int)
+            age[:self.size] = self.age
+            self.support, self.beta, self.age = support, betas, age
+        self.support[self.size] = x_i
+        self.beta[self.size] = beta
+        self.age[self.size] = self.count
+        self.size += 1
+        self.count += 1
+
+    def evict(self):
+        """Remove one support vector according to self.eviction."""
+        if self.eviction == 'oldest':
+            k = np.argmin(self.age[:self.size])
+        elif self.eviction == 'random':
+            k = self.rng.randint(self.size)
+        else:
+            k = np.argmin(np.abs(self.betas))
+        # Move the last support vector into the freed row
+        last = self.size - 1
+        self.support[k] = self.support[last]
+        self.beta[k] = self.beta[last]
+        self.age[k] = self.age[last]
+        self.size = last
+
+    def merge(self, x_i, beta):
+        """Merge (x_i, beta) into the nearest support vector whose beta has
+        the same sign. Returns False if there is no such support vector."""
+        same_sign = np.nonzero(np.sign(self.betas) == np.sign(beta))[0]
+        if same_sign.shape[0] == 0:
+            return False
+        distance = np.sum((self.support[same_sign] - x_i) ** 2, axis=1)
+        k = same_sign[np.argmin(distance)]
+        weight = abs(beta) / (abs(beta) + abs(self.beta[k]))
+        self.support[k] = (1 - weight) * self.support[k] + weight * np.asarray(x_i)
+        self.beta[k] += beta
+        self.age[k] = self.count
+        self.count += 1
+        return True
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return zip(self.vectors, self.betas)
+
+
+class RandomFourierFeatures(object):
+    """Random Fourier features z with z(a).z(b) ~= rbf_kernel(a, b, sigma).
+
+    z(a) = sqrt(2 / n_features) * cos(a W + b) with W ~ N(0, 1 / sigma^2) and
+    b ~ U[0, 2 pi]. More features give a closer approximation at a higher
+    cost per update and prediction. Calling the object evaluates the
+    approximate kernel, so it can also be used as a regular kernel.
+    """
+
+    def __init__(self, dim, n_features=500, sigma=1, seed=0):
+        """
+        Args:
+            dim: Dimension of the inputs.
+            n_features: Number of random features D.
+            sigma: The radius of the approximated RBF kernel.
+            seed: Seed for drawing W and b.
+        """
+        rng = np.random.RandomState(seed)
+        self.W = rng.normal(scale=1. / sigma, size=(dim, n_features))
+        self.b = rng.uniform(0, 2 * np.pi, size=n_features)
+        self.scale = np.sqrt(2. / n_features)
+
+    def transform(self, x):
+        """Map a vector (dim,) or matrix (n_examples, dim) to its features."""
+        return self.scale * np.cos(np.dot(x, self.W) + self.b)
+
+    def __call__(self, a, b):
+        return np.dot(self.transform(a), self.transform(b))
+
+
+class FourierState(object):
+    """Primal perceptron weights on random Fourier features.
+
+    A single weight vector of length n_features replaces the support vectors,
+    so updates and predictions cost O(n_features) however many examples have
+    been seen.
+    """
+
+    def __init__(self, features):
+        """
+        Args:
+            features: The RandomFourierFeatures the weights live on.
+        """
+        self.features = features
+        self.w = np.zeros(features.b.shape[0])
+
+    def add(self, x_i, beta):
+        """Add beta * z(x_i) to the weights."""
+        if beta != 0:
+            self.w += beta * self.features.transform(x_i)
+
+
 def predict(state, kernel, x_i):
     """Peform a prediction on a given instance x_i given the current state
     and the kernel.
@@ -35,12 +227,36 @@ def predict(state, kernel, x_i):
         Returns the prediction (i.e 0 or 1)
     """
     # *** START CODE HERE ***
-    sum = 0
-    for x_prev, beta in state:
-        sum += beta * kernel(x_prev, x_i)
-    return sign(sum)
+    return predict_batch(state, kernel, np.reshape(x_i, (1, -1)))[0]
     # *** END CODE HERE ***
 
+
+def predict_batch(state, kernel, x, max_block=2 ** 20):
+    """Perform predictions on many instances at once.
+
+    Rows of x are scored in tiles so that no kernel block holds more than
+    max_block entries.
+
+    Args:
+        state: The state returned from initial_state()
+        kernel: A kernel function, ideally with a batch form registered
+            through register_batch_kernel
+        x: A matrix of instances. Shape (n_examples, dim).
+        max_block: Maximum number of kernel entries computed at once
+
+    Returns:
+        Returns the predictions (0 or 1). Shape (n_examples,).
+    """
+    if isinstance(state, FourierState):
+        return (np.dot(state.features.transform(x), state.w) >= 0).astype(int)
+    scores = np.zeros(x.shape[0])
+    if len(state) > 0:
+        tile = max(1, max_block // len(state))
+        for start in range(0, x.shape[0], tile):
+            block = kernel_block(kernel, x[start:start + tile], state.vectors)
+            scores[start:start + tile] = np.dot(block, state.betas)
+    return (scores >= 0).astype(int)
+
 def update_state(state, kernel, learning_rate, x_i, y_i):
     """Updates the state of the perceptron.
 
@@ -54,7 +270,7 @@ def update_state(state, kernel, learning_rate, x_i, y_i):
     # *** START CODE HERE ***
     h_x = predict(state, kernel, x_i)
     beta = learning_rate * (y_i - h_x)
-    state += [(x_i, beta)]
+    state.add(x_i, beta)
     return state
     # *** END CODE HERE ***
 
@@ -67,6 +283,33 @@ def sign(a):
         return 0
 
 
+# Batch forms of kernels: kernel -> function mapping matrices A (n, dim) and
+# B (m, dim) to the (n, m) block of kernel(A[i], B[j])
+batch_kernels = {}
+
+
+def register_batch_kernel(kernel, batch_kernel):
+    """Register the batch form of a kernel for use by predict_batch.
+
+    Args:
+        kernel: A binary function on two vectors
+        batch_kernel: A function mapping matrices A (n, dim) and B (m, dim)
+            to the (n, m) matrix of kernel(A[i], B[j])
+    """
+    batch_kernels[kernel] = batch_kernel
+
+
+def kernel_block(kernel, a, b):
+    """Compute the (n, m) kernel matrix between the rows of a and b.
+
+    Uses the registered batch form of the kernel if there is one, and
+    otherwise calls the kernel on every pair of rows.
+    """
+    if kernel in batch_kernels:
+        return batch_kernels[kernel](a, b)
+    return np.array([[kernel(a_i, b_j) for b_j in b] for a_i in a]).reshape(a.shape[0], b.shape[0])
+
+
 def dot_kernel(a, b):
     """An implementation of a dot product kernel.
 
@@ -100,7 +343,109 @@ def non_psd_kernel(a, b):
         return -1
     return 0
 
-def train_perceptron(kernel_name, kernel, learning_rate):
+
+def dot_kernel_batch(a, b):
+    """Batch form of dot_kernel."""
+    return np.dot(a, b.transpose())
+
+
+def rbf_kernel_batch(a, b, sigma=1):
+    """Batch form of rbf_kernel, using |a - b|^2 = |a|^2 + |b|^2 - 2 a.b"""
+    distance = (np.sum(a ** 2, axis=1)[:, None] + np.sum(b ** 2, axis=1)[None, :]
+                - 2 * np.dot(a, b.transpose()))
+    return np.exp(-np.maximum(distance, 0) / (2 * (sigma) ** 2))
+
+
+def non_psd_kernel_batch(a, b):
+    """Batch form of non_psd_kernel."""
+    close = np.all(np.abs(a[:, None, :] - b[None, :, :])
+                   <= 1e-8 + 1e-5 * np.abs(b[None, :, :]), axis=2)
+    return -close.astype(float)
+
+
+register_batch_kernel(dot_kernel, dot_kernel_batch)
+register_batch_kernel(rbf_kernel, rbf_kernel_batch)
+register_batch_kernel(non_psd_kernel, non_psd_kernel_batch)
+
+def train_epochs(kernel, learning_rate, x, y, max_epochs=10, shuffle=True,
+                 seed=0, max_gram=2 ** 22, cache_size=1024):
+    """Train a perceptron with several passes over the training set.
+
+    Training runs on the coefficients alpha of the training examples while
+    keeping the scores K alpha of every training example up to date, so a
+    prediction is a lookup and a mistake on example j adds beta * K[:, j] to
+    the scores. The kernel matrix K is precomputed when it has at most
+    max_gram entries; otherwise its columns are computed on demand and the
+    cache_size most recently used ones are kept.
+
+    Args:
+        kernel: The kernel function.
+        learning_rate: The learning rate for the update
+        x: Training inputs. Shape (n_examples, dim).
+        y: Training labels in {0, 1}. Shape (n_examples,).
+        max_epochs: Maximum number of passes over the training set.
+        shuffle: Visit the examples in a new random order every epoch.
+        seed: Seed for the shuffling.
+        max_gram: Largest kernel matrix (in entries) to precompute.
+        cache_size: Number of kernel columns to cache otherwise.
+
+    Returns:
+        The state, as returned by initial_state(), for use with predict.
+    """
+    n = x.shape[0]
+    columns = KernelColumns(kernel, x, max_gram, cache_size)
+    alpha = np.zeros(n)
+    scores = np.zeros(n)
+    rng = np.random.RandomState(seed)
+    for epoch in range(max_epochs):
+        order = rng.permutation(n) if shuffle else range(n)
+        mistakes = 0
+        for i in order:
+            beta = learning_rate * (y[i] - sign(scores[i]))
+            if beta != 0:
+                alpha[i] += beta
+                scores += beta * columns[i]
+                mistakes += 1
+        if mistakes == 0:
+            break
+
+    state = initial_state()
+    for i in np.nonzero(alpha)[0]:
+        state.add(x[i], alpha[i])
+    return state
+
+
+class KernelColumns(object):
+    """Columns K[:, j] = kernel(x_i, x_j) of the training kernel matrix.
+
+    The whole matrix is computed up front when it has at most max_gram
+    entries. Otherwise each column is computed when first needed and kept in
+    a least recently used cache of cache_size columns.
+    """
+
+    def __init__(self, kernel, x, max_gram=2 ** 22, cache_size=1024):
+        self.kernel = kernel
+        self.x = x
+        self.cache_size = cache_size
+        self.cache = collections.OrderedDict()
+        self.gram = None
+        if x.shape[0] ** 2 <= max_gram:
+            self.gram = kernel_block(kernel, x, x)
+
+    def __getitem__(self, j):
+        if self.gram is not None:
+            return self.gram[:, j]
+        if j in self.cache:
+            self.cache.move_to_end(j)
+            return self.cache[j]
+        column = kernel_block(self.kernel, self.x, self.x[j:j + 1])[:, 0]
+        self.cache[j] = column
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return column
+
+
+def train_perceptron(kernel_name, kernel, learning_rate, epochs=1):
     """Train a perceptron with the given kernel.
 
     This function trains a perceptron with a given kernel and then
@@ -110,24 +455,37 @@ def train_perceptron(kernel_name, kernel, learning_rate):
 
     Args:
         kernel_name: The name of the kernel.
-        kernel: The kernel function.
+        kernel: The kernel function, or RandomFourierFeatures to train an
+            approximate RBF perceptron in the primal.
         learning_rate: The learning rate for training.
+        epochs: Maximum number of passes over the training set. Passes after
+            a single one are shuffled, and training stops early after a pass
+            without mistakes.
     """
     train_x, train_y = util.load_csv('train.csv')
 
-    state = initial_state()
-
-    for x_i, y_i in zip(train_x, train_y):
-        update_state(state, kernel, learning_rate, x_i, y_i)
+    if isinstance(kernel, RandomFourierFeatures):
+        state = initial_state(kernel)
+        rng = np.random.RandomState(0)
+        for epoch in range(epochs):
+            order = rng.permutation(train_x.shape[0]) if epochs > 1 else range(train_x.shape[0])
+            w = state.w.copy()
+            for i in order:
+                update_state(state, kernel, learning_rate, train_x[i], train_y[i])
+            if np.array_equal(w, state.w):
+                break
+    else:
+        state = train_epochs(kernel, learning_rate, train_x, train_y,
+                             max_epochs=epochs, shuffle=epochs > 1)
 
     test_x, test_y = util.load_csv('test.csv')
 
     plt.figure(figsize=(12, 8))
-    util.plot_contour(lambda a: predict(state, kernel, a))
+    util.plot_contour(lambda a: predict_batch(state, kernel, a), batched=True)
     util.plot_points(test_x, test_y)
     plt.savefig('perceptron_{}_output.png'.format(kernel_name))
 
-    predict_y = [predict(state, kernel, test_x[i, :]) for i in range(test_y.shape[0])]
+    predict_y = predict_batch(state, kernel, test_x)
 
     np.savetxt('perceptron_{}_predictions'.format(kernel_name), predict_y)
 
@@ -61,6 +61,8 @@ def main():
     print('\n==== Training model on data set B ====')
     Xb, Yb = util.load_csv('ds1_b.csv', add_intercept=True)
     logistic_regression(Xb, Yb)
+    # Wait for the background plots so rendering errors are raised here
+    util.plot_sink.flush()
 
 
 if __name__ == '__main__':
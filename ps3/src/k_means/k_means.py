@@ -1,10 +1,97 @@
 from __future__ import division, print_function
 import argparse
-import matplotlib.image as mpimg
-import matplotlib.pyplot as plt
+import atexit
+import multiprocessing
 import numpy as np
 import os
+import pickle
 import random
+import sys
+import traceback
+
+
+class LazyPyplot(object):
+    """matplotlib.pyplot, imported on first use.
+
+    Training and prediction never pay for the import. The non-interactive Agg
+    backend is selected when no display is available, so headless runs never
+    load a GUI toolkit.
+    """
+    def __getattr__(self, name):
+        if 'matplotlib.pyplot' not in sys.modules:
+            import matplotlib
+            headless = not (os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+            if os.name == 'posix' and sys.platform != 'darwin' and headless:
+                matplotlib.use('Agg')
+        import matplotlib.pyplot
+        return getattr(matplotlib.pyplot, name)
+
+
+plt = LazyPyplot()
+
+class PlotSink(object):
+    """Renders figures in a background process, off the training critical path.
+
+    submit() snapshots a module-level render function and its array arguments
+    and returns immediately; a single worker process draws and saves the
+    figure with the Agg backend. flush() waits for everything queued so far
+    and re-raises rendering errors. Pending plots are flushed at exit, and a
+    failure there makes the process exit with status 1.
+    """
+    def __init__(self):
+        self.pool = None
+        self.pending = []
+
+    def submit(self, render_fn, *args):
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(1, initializer=init_plot_worker)
+            atexit.register(self.close_at_exit)
+        payload = pickle.dumps((render_fn, args), protocol=pickle.HIGHEST_PROTOCOL)
+        self.pending.append(self.pool.apply_async(run_render, (payload,)))
+
+    def flush(self):
+        pending, self.pending = self.pending, []
+        for result in pending:
+            result.get()
+
+    def close(self):
+        if self.pool is None:
+            return
+        try:
+            self.flush()
+        finally:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def close_at_exit(self):
+        """Flush pending plots at exit, exiting with status 1 if one failed.
+
+        An exception raised by an atexit handler only prints a traceback and
+        leaves the exit status at 0, so failures are reported here and the
+        process is ended explicitly.
+        """
+        try:
+            self.close()
+        except Exception:
+            traceback.print_exc()
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(1)
+
+
+def init_plot_worker():
+    """Use the non-interactive Agg backend in the plotting process."""
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def run_render(payload):
+    render_fn, args = pickle.loads(payload)
+    render_fn(*args)
+
+
+plot_sink = PlotSink()
 
 
 def init_centroids(num_clusters, image):
@@ -124,6 +211,8 @@ def update_image(image, centroids):
 
 
 def main(args):
+    # Imported here so that importing this module does not load matplotlib
+    import matplotlib.image as mpimg
 
     # Setup
     max_iter = args.max_iter
@@ -131,18 +220,12 @@ def main(args):
     image_path_small = args.small_path
     image_path_large = args.large_path
     num_clusters = args.num_clusters
-    figure_idx = 0
 
     # Load small image
     image = np.copy(mpimg.imread(image_path_small))
     print('[INFO] Loaded small image with shape: {}'.format(np.shape(image)))
-    plt.figure(figure_idx)
-    figure_idx += 1
-    plt.imshow(image)
-    plt.title('Original small image')
-    plt.axis('off')
     savepath = os.path.join('.', 'orig_small.png')
-    plt.savefig(savepath, transparent=True, format='png', bbox_inches='tight')
+    plot_sink.submit(render_image, image, 'Original small image', savepath)
 
     # Initialize centroids
     print('[INFO] Centroids initialized')
@@ -158,13 +241,8 @@ def main(args):
     image = np.copy(mpimg.imread(image_path_large))
     image.setflags(write=1)
     print('[INFO] Loaded large image with shape: {}'.format(np.shape(image)))
-    plt.figure(figure_idx)
-    figure_idx += 1
-    plt.imshow(image)
-    plt.title('Original large image')
-    plt.axis('off')
     savepath = os.path.join('.', 'orig_large.png')
-    plt.savefig(fname=savepath, transparent=True, format='png', bbox_inches='tight')
+    plot_sink.submit(render_image, image, 'Original large image', savepath)
 
     # Update large image with centroids calculated on small image
     print(25 * '=')
@@ -172,16 +250,25 @@ def main(args):
     print(25 * '=')
     image_clustered = update_image(image, centroids)
 
-    plt.figure(figure_idx)
-    figure_idx += 1
-    plt.imshow(image_clustered)
-    plt.title('Updated large image')
-    plt.axis('off')
     savepath = os.path.join('.', 'updated_large.png')
-    plt.savefig(fname=savepath, transparent=True, format='png', bbox_inches='tight')
+    plot_sink.submit(render_image, image_clustered, 'Updated large image', savepath)
 
+    plot_sink.flush()
     print('\nCOMPLETE')
-    plt.show()
+
+
+def render_image(image, title, savepath):
+    """Save `image` as a titled PNG. Runs in the plotting process.
+
+    Images are snapshotted when submitted, so later in-place updates (e.g. by
+    update_image) do not leak into the saved file.
+    """
+    plt.figure()
+    plt.imshow(image)
+    plt.title(title)
+    plt.axis('off')
+    plt.savefig(savepath, transparent=True, format='png', bbox_inches='tight')
+    plt.close()
 
 
 if __name__ == '__main__':
@@ -1,7 +1,31 @@
-import matplotlib.pyplot as plt
+import hashlib
+import json
+import os
+import sys
+
 import numpy as np
 
 
+class LazyPyplot(object):
+    """matplotlib.pyplot, imported on first use.
+
+    Training and prediction never pay for the import. The non-interactive Agg
+    backend is selected when no display is available, so headless runs never
+    load a GUI toolkit.
+    """
+    def __getattr__(self, name):
+        if 'matplotlib.pyplot' not in sys.modules:
+            import matplotlib
+            headless = not (os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+            if os.name == 'posix' and sys.platform != 'darwin' and headless:
+                matplotlib.use('Agg')
+        import matplotlib.pyplot
+        return getattr(matplotlib.pyplot, name)
+
+
+plt = LazyPyplot()
+
+
 def add_intercept(x):
     """Add intercept to matrix x.
 
@@ -18,13 +42,134 @@ def add_intercept(x):
     return new_x
 
 
-def load_dataset(csv_path, label_col='y', add_intercept=False):
+def load_csv_array(csv_path, dtype=np.float64, cache=True):
+    """Read a numeric CSV file with one header row in a single pass.
+
+    With cache=True the parsed array is also written to a binary .npy
+    sidecar next to the CSV, keyed on the file's size, mtime and content
+    hash. Later calls memory-map the sidecar copy-on-write instead of
+    parsing the text again, so repeat runs start fast and share pages until
+    an array is modified.
+
+    Args:
+        csv_path: Path to CSV file.
+        dtype: Floating-point type of the returned array.
+        cache: Read from and write to the .npy sidecar cache.
+
+    Returns:
+        headers: List of column names.
+        data: Numpy array of shape (n_rows, n_columns). Writable whether or
+            not it comes from the cache; writes never reach the sidecar.
+    """
+    if cache:
+        cached = load_cached_array(csv_path, dtype)
+        if cached is not None:
+            return cached
+
+    with open(csv_path, 'r') as csv_fh:
+        headers = csv_fh.readline().strip().split(',')
+        data = parse_csv_text(csv_fh.read(), len(headers), dtype)
+
+    if cache:
+        save_cached_array(csv_path, dtype, headers, data)
+
+    return headers, data
+
+
+def parse_csv_text(text, n_columns, dtype=np.float64):
+    """Parse comma-separated numeric rows (no header) into a 2D array.
+
+    Like np.loadtxt, rejects rows without exactly n_columns fields and
+    fields that are not numbers, instead of silently shifting later rows.
+    """
+    lines = [line for line in text.splitlines() if line.strip()]
+    for i, line in enumerate(lines):
+        if line.count(',') != n_columns - 1:
+            raise ValueError('Invalid row {}: {!r} (expected {} columns)'
+                             .format(i + 1, line, n_columns))
+    data = np.fromstring(','.join(lines), dtype=dtype, sep=',')
+    if data.shape[0] != len(lines) * n_columns:
+        raise ValueError('Invalid CSV data: {} numbers parsed (expected {})'
+                         .format(data.shape[0], len(lines) * n_columns))
+    return data.reshape(-1, n_columns)
+
+
+def cache_paths(csv_path, dtype):
+    """Paths of the .npy sidecar and its JSON metadata for csv_path."""
+    prefix = '{}.{}'.format(csv_path, np.dtype(dtype).name)
+    return prefix + '.npy', prefix + '.json'
+
+
+def file_hash(path):
+    """SHA-1 of a file's contents, read in 1 MB blocks."""
+    sha = hashlib.sha1()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def load_cached_array(csv_path, dtype):
+    """Return (headers, data) from the sidecar cache, or None if it is stale.
+
+    Size and mtime are checked first. If only the mtime changed (e.g. after a
+    fresh checkout), the content hash decides whether the cache is reused.
+    """
+    npy_path, meta_path = cache_paths(csv_path, dtype)
+    try:
+        with open(meta_path, 'r') as meta_fh:
+            meta = json.load(meta_fh)
+        stat = os.stat(csv_path)
+        if meta['size'] != stat.st_size:
+            return None
+        if meta['mtime_ns'] != stat.st_mtime_ns:
+            if meta['sha1'] != file_hash(csv_path):
+                return None
+            meta['mtime_ns'] = stat.st_mtime_ns
+            write_atomic(meta_path, lambda fh: fh.write(json.dumps(meta).encode()))
+        data = np.load(npy_path, mmap_mode='c')
+    except (OSError, ValueError, KeyError):
+        return None
+
+    return meta['headers'], np.asarray(data)
+
+
+def save_cached_array(csv_path, dtype, headers, data):
+    """Write the .npy sidecar and its metadata, ignoring unwritable dirs."""
+    npy_path, meta_path = cache_paths(csv_path, dtype)
+    try:
+        stat = os.stat(csv_path)
+        meta = {'headers': headers, 'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns, 'sha1': file_hash(csv_path)}
+        write_atomic(npy_path, lambda fh: np.save(fh, data))
+        write_atomic(meta_path, lambda fh: fh.write(json.dumps(meta).encode()))
+    except OSError:
+        pass
+
+
+def write_atomic(path, write_fn):
+    """Call write_fn on a temporary file, then move it over path."""
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, 'wb') as fh:
+        write_fn(fh)
+    os.replace(tmp_path, path)
+
+
+def select_cols(data, cols):
+    """Return data[:, cols], as a view when cols are contiguous."""
+    if len(cols) > 0 and cols == list(range(cols[0], cols[-1] + 1)):
+        return data[:, cols[0]:cols[-1] + 1]
+    return data[:, cols]
+
+
+def load_dataset(csv_path, label_col='y', add_intercept=False, dtype=np.float64):
     """Load dataset from a CSV file.
 
     Args:
          csv_path: Path to CSV file containing dataset.
          label_col: Name of column to use as labels (should be 'y' or 't').
          add_intercept: Add an intercept entry to x-values.
+         dtype: Floating-point type of the returned arrays (np.float32 or np.float64).
 
     Returns:
         xs: Numpy array of x-values (inputs).
@@ -41,35 +186,54 @@ def load_dataset(csv_path, label_col='y', add_intercept=False):
         raise ValueError('Invalid label_col: {} (expected {})'
                          .format(label_col, allowed_label_cols))
 
-    # Load headers
-    with open(csv_path, 'r') as csv_fh:
-        headers = csv_fh.readline().strip().split(',')
+    # Load headers and values with a single read
+    headers, data = load_csv_array(csv_path, dtype)
 
-    # Load features and labels
+    # Split features and labels as column views
     x_cols = [i for i in range(len(headers)) if headers[i].startswith('x')]
     l_cols = [i for i in range(len(headers)) if headers[i] == label_col]
-    inputs = np.loadtxt(csv_path, delimiter=',', skiprows=1, usecols=x_cols)
-    labels = np.loadtxt(csv_path, delimiter=',', skiprows=1, usecols=l_cols)
+    inputs = select_cols(data, x_cols)
+    labels = select_cols(data, l_cols)
 
-    if inputs.ndim == 1:
-        inputs = np.expand_dims(inputs, -1)
+    if labels.shape[1] == 1:
+        labels = labels[:, 0]
 
     if add_intercept:
         inputs = add_intercept_fn(inputs)
 
     return inputs, labels
 
-def plot_contour(predict_fn):
-    """Plot a contour given the provided prediction function"""
-    x, y = np.meshgrid(np.linspace(0, 4, num=20), np.linspace(0, 4, num=20))
-    z = np.zeros(x.shape)
+def plot_contour(predict_fn, num=20, batched=True):
+    """Plot a contour given the provided prediction function.
 
-    for i in range(x.shape[0]):
-        for j in range(y.shape[1]):
-            z[i, j] = predict_fn(np.array([[1, x[i, j], y[i, j]]]))[0]
+    Args:
+        predict_fn: Predictor mapping inputs of shape (n_points, 3), with the
+            intercept in column 0, to n_points predictions.
+        num: Grid resolution along each axis.
+        batched: Call predict_fn once on the whole grid, instead of once per
+            point with inputs of shape (1, 3).
+    """
+    x, y = np.meshgrid(np.linspace(0, 4, num=num), np.linspace(0, 4, num=num))
+    points = np.stack([np.ones(x.size), x.ravel(), y.ravel()], axis=1)
+    z = predict_points(predict_fn, points, batched).reshape(x.shape)
 
     plt.contourf(x, y, z, levels=[-float('inf'), 0, float('inf')], colors=['orange', 'cyan'])
 
+
+def predict_points(predict_fn, points, batched):
+    """Evaluate predict_fn on every row of points.
+
+    With batched=True, predict_fn is called once on all points and must
+    return one prediction per point; otherwise it is called once per point.
+    """
+    if batched:
+        z = np.asarray(predict_fn(points), dtype=float).reshape(-1)
+        if z.shape[0] != points.shape[0]:
+            raise ValueError('Invalid batched predictions: {} values (expected {})'
+                             .format(z.shape[0], points.shape[0]))
+        return z
+    return np.array([predict_fn(point[None, :])[0] for point in points], dtype=float)
+
 def plot(x, y, predict_fn, save_path, correction=1.0):
     """Plot dataset and fitted logistic regression parameters.
 
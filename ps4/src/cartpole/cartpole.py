@@ -3,8 +3,7 @@ CS 229 Machine Learning
 Question: Reinforcement Learning - The Inverted Pendulum
 """
 from __future__ import division, print_function
-from env import CartPole, Physics
-import matplotlib.pyplot as plt
+from env import CartPole, Physics, plt
 import numpy as np
 from scipy.signal import lfilter
 
@@ -4,8 +4,29 @@ Question: Reinforcement Learning - The Inverted Pendulum
 """
 from __future__ import division, print_function
 from math import sin, cos, pi
-import matplotlib.pyplot as plt
-import matplotlib.patches as patches
+import os
+import sys
+
+
+class LazyPyplot(object):
+    """matplotlib.pyplot, imported on first use.
+
+    Training and prediction never pay for the import. The non-interactive Agg
+    backend is selected when no display is available, so headless runs never
+    load a GUI toolkit.
+    """
+    def __getattr__(self, name):
+        if 'matplotlib.pyplot' not in sys.modules:
+            import matplotlib
+            headless = not (os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+            if os.name == 'posix' and sys.platform != 'darwin' and headless:
+                matplotlib.use('Agg')
+        import matplotlib.pyplot
+        return getattr(matplotlib.pyplot, name)
+
+
+plt = LazyPyplot()
+
 
 class CartPole:
     def __init__(self, physics):
@@ -136,6 +157,7 @@ class CartPole:
         Returns
         -------
         """
+        import matplotlib.patches as patches
         x, x_dot, theta, theta_dot = state_tuple
         X = [x, x + 4*self.length * sin(theta)]
         Y = [0, 4*self.length * cos(theta)]
@@ -1,6 +1,95 @@
 import numpy as np
-import matplotlib.pyplot as plt
 import argparse
+import atexit
+import multiprocessing
+import os
+import pickle
+import sys
+import traceback
+
+
+class LazyPyplot(object):
+    """matplotlib.pyplot, imported on first use.
+
+    Training and prediction never pay for the import. The non-interactive Agg
+    backend is selected when no display is available, so headless runs never
+    load a GUI toolkit.
+    """
+    def __getattr__(self, name):
+        if 'matplotlib.pyplot' not in sys.modules:
+            import matplotlib
+            headless = not (os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+            if os.name == 'posix' and sys.platform != 'darwin' and headless:
+                matplotlib.use('Agg')
+        import matplotlib.pyplot
+        return getattr(matplotlib.pyplot, name)
+
+
+plt = LazyPyplot()
+
+class PlotSink(object):
+    """Renders figures in a background process, off the training critical path.
+
+    submit() snapshots a module-level render function and its array arguments
+    and returns immediately; a single worker process draws and saves the
+    figure with the Agg backend. flush() waits for everything queued so far
+    and re-raises rendering errors. Pending plots are flushed at exit, and a
+    failure there makes the process exit with status 1.
+    """
+    def __init__(self):
+        self.pool = None
+        self.pending = []
+
+    def submit(self, render_fn, *args):
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(1, initializer=init_plot_worker)
+            atexit.register(self.close_at_exit)
+        payload = pickle.dumps((render_fn, args), protocol=pickle.HIGHEST_PROTOCOL)
+        self.pending.append(self.pool.apply_async(run_render, (payload,)))
+
+    def flush(self):
+        pending, self.pending = self.pending, []
+        for result in pending:
+            result.get()
+
+    def close(self):
+        if self.pool is None:
+            return
+        try:
+            self.flush()
+        finally:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def close_at_exit(self):
+        """Flush pending plots at exit, exiting with status 1 if one failed.
+
+        An exception raised by an atexit handler only prints a traceback and
+        leaves the exit status at 0, so failures are reported here and the
+        process is ended explicitly.
+        """
+        try:
+            self.close()
+        except Exception:
+            traceback.print_exc()
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(1)
+
+
+def init_plot_worker():
+    """Use the non-interactive Agg backend in the plotting process."""
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def run_render(payload):
+    render_fn, args = pickle.loads(payload)
+    render_fn(*args)
+
+
+plot_sink = PlotSink()
 
 def softmax(x):
     """
@@ -279,31 +368,37 @@ def run_train_test(name, all_data, all_labels, backward_prop_func, num_epochs, p
     t = np.arange(num_epochs)
 
     if plot:
-        fig, (ax1, ax2) = plt.subplots(2, 1)
-
-        ax1.plot(t, cost_train,'r', label='train')
-        ax1.plot(t, cost_dev, 'b', label='dev')
-        ax1.set_xlabel('epochs')
-        ax1.set_ylabel('loss')
-        if name == 'baseline':
-            ax1.set_title('Without Regularization')
-        else:
-            ax1.set_title('With Regularization')
-        ax1.legend()
-
-        ax2.plot(t, accuracy_train,'r', label='train')
-        ax2.plot(t, accuracy_dev, 'b', label='dev')
-        ax2.set_xlabel('epochs')
-        ax2.set_ylabel('accuracy')
-        ax2.legend()
-
-        fig.savefig('./' + name + '.pdf')
+        plot_sink.submit(render_curves, name, t, cost_train, cost_dev,
+                         accuracy_train, accuracy_dev)
 
     accuracy = nn_test(all_data['test'], all_labels['test'], params)
     print('For model %s, got accuracy: %f' % (name, accuracy))
     
     return accuracy
 
+def render_curves(name, t, cost_train, cost_dev, accuracy_train, accuracy_dev):
+    """Save the loss and accuracy curves to ./name.pdf. Runs in the plotting process."""
+    fig, (ax1, ax2) = plt.subplots(2, 1)
+
+    ax1.plot(t, cost_train,'r', label='train')
+    ax1.plot(t, cost_dev, 'b', label='dev')
+    ax1.set_xlabel('epochs')
+    ax1.set_ylabel('loss')
+    if name == 'baseline':
+        ax1.set_title('Without Regularization')
+    else:
+        ax1.set_title('With Regularization')
+    ax1.legend()
+
+    ax2.plot(t, accuracy_train,'r', label='train')
+    ax2.plot(t, accuracy_dev, 'b', label='dev')
+    ax2.set_xlabel('epochs')
+    ax2.set_ylabel('accuracy')
+    ax2.legend()
+
+    fig.savefig('./' + name + '.pdf')
+    plt.close(fig)
+
 def main(plot=True):
     parser = argparse.ArgumentParser(description='Train a nn model.')
     parser.add_argument('--num_epochs', type=int, default=30)
@@ -347,6 +442,7 @@ def main(plot=True):
     reg_acc = run_train_test('regularized', all_data, all_labels, 
         lambda a, b, c, d: backward_prop_regularized(a, b, c, d, reg=0.0001),
         args.num_epochs, plot)
+    plot_sink.flush()
         
     return baseline_acc, reg_acc
 